@@ -1,265 +1,657 @@
 import openai
-import json
+import asyncio
+import inspect
+import hashlib
+import orjson
+import re
 import uuid
+from collections import deque
+from collections.abc import Mapping
+from types import MappingProxyType
 from typing import Dict, List, Optional, AsyncGenerator
-from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
 
-from .tools import CampusTools, TOOL_FUNCTIONS
-from .db import Conversation, get_db
+from .cache import TTLCache
+from .tools_new import CampusTools
+from .db import Conversation, conversation_writer
+from .logging_config import ai_logger
+from .models import ConversationTurn, StudentCreate, StudentUpdate
 
 load_dotenv()
 
-class CampusAgent:
-    def __init__(self, db: Session):
-        self.db = db
-        self.tools = CampusTools(db)
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.conversation_memory = {}
+# Shared async client so connection pooling carries over between requests
+_openai_client: Optional[openai.AsyncOpenAI] = None
+
+def get_openai_client() -> openai.AsyncOpenAI:
+    """Get the shared OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _openai_client
+
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
+CHAT_MODEL_SIMPLE = os.getenv("CHAT_MODEL_SIMPLE", "gpt-4o-mini")
+CHAT_MODEL_COMPLEX = os.getenv("CHAT_MODEL_COMPLEX", "gpt-4o")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "300"))
+
+# Functions whose result never changes between calls, with how long (seconds)
+# an answer built on them may be served from cache
+CACHEABLE_FUNCTIONS = {
+    "get_cafeteria_timings": 3600,
+    "get_library_hours": 3600,
+    "get_event_schedule": 3600,
+}
+
+SYSTEM_PROMPT = (
+    "You are the Campus Admin Agent, a helpful assistant for campus staff. "
+    "You manage student records (add, look up, update, delete), report campus "
+    "analytics, share cafeteria, library and event information, and send mock "
+    "emails to students. Use the available tools for any database operation and "
+    "confirm results clearly and professionally."
+)
+
+def sse_event(data: Dict) -> bytes:
+    """Encode a payload as a Server-Sent Events data frame"""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+# Sent once per stream instead of alongside every frame
+SSE_RETRY_FRAME = b"retry: 15000\n\n"
+# Frames are coalesced into one write once this many bytes are pending...
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "4096"))
+# ...or once the oldest pending frame has waited this long
+SSE_FLUSH_INTERVAL = int(os.getenv("SSE_FLUSH_INTERVAL_MS", "50")) / 1000
+
+async def buffered_sse(
+    frames: AsyncGenerator[bytes, None],
+    flush_bytes: int = SSE_FLUSH_BYTES,
+    flush_interval: float = SSE_FLUSH_INTERVAL
+) -> AsyncGenerator[bytes, None]:
+    """Coalesce SSE frames into fewer, larger writes without holding any frame too long"""
+    loop = asyncio.get_running_loop()
+    buffer = bytearray(SSE_RETRY_FRAME)
+    deadline = loop.time()
+    next_frame = None
+    
+    try:
+        while True:
+            if next_frame is None:
+                next_frame = asyncio.ensure_future(frames.__anext__())
+            
+            timeout = max(deadline - loop.time(), 0) if buffer else None
+            done, _ = await asyncio.wait({next_frame}, timeout=timeout)
+            if not done:
+                # The producer is slow; send what we have rather than wait
+                yield bytes(buffer)
+                buffer.clear()
+                continue
+            
+            try:
+                frame = next_frame.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_frame = None
+            
+            if not buffer:
+                deadline = loop.time() + flush_interval
+            buffer += frame
+            if len(buffer) >= flush_bytes:
+                yield bytes(buffer)
+                buffer.clear()
         
-        # Define the function schemas for OpenAI
-        self.function_schemas = [
-            {
-                "name": "add_student",
-                "description": "Add a new student to the campus database",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "name": {"type": "string", "description": "Student's full name"},
-                        "id": {"type": "string", "description": "Student ID"},
-                        "department": {"type": "string", "description": "Student's department"},
-                        "email": {"type": "string", "description": "Student's email address"}
-                    },
-                    "required": ["name", "id", "department", "email"]
-                }
-            },
-            {
-                "name": "get_student",
-                "description": "Get student information by ID",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "id": {"type": "string", "description": "Student ID"}
-                    },
-                    "required": ["id"]
-                }
-            },
-            {
-                "name": "update_student",
-                "description": "Update a student's information",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "id": {"type": "string", "description": "Student ID"},
-                        "field": {"type": "string", "enum": ["name", "department", "email"], "description": "Field to update"},
-                        "new_value": {"type": "string", "description": "New value for the field"}
-                    },
-                    "required": ["id", "field", "new_value"]
-                }
-            },
-            {
-                "name": "delete_student",
-                "description": "Delete a student from the database",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "id": {"type": "string", "description": "Student ID"}
-                    },
-                    "required": ["id"]
-                }
-            },
-            {
-                "name": "list_students",
-                "description": "List all students in the database",
-                "parameters": {"type": "object", "properties": {}}
-            },
-            {
-                "name": "get_total_students",
-                "description": "Get the total number of students",
-                "parameters": {"type": "object", "properties": {}}
-            },
-            {
-                "name": "get_students_by_department",
-                "description": "Get student count grouped by department",
-                "parameters": {"type": "object", "properties": {}}
-            },
-            {
-                "name": "get_recent_onboarded_students",
-                "description": "Get recently onboarded students",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "limit": {"type": "integer", "description": "Number of students to return", "default": 5}
-                    }
-                }
-            },
-            {
-                "name": "get_active_students_last_7_days",
-                "description": "Get count of active students in the last 7 days",
-                "parameters": {"type": "object", "properties": {}}
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        if next_frame is not None:
+            # Let the cancelled __anext__ unwind first; aclose() fails while it is still running
+            next_frame.cancel()
+            try:
+                await next_frame
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await frames.aclose()
+
+def _model_dump_json(value):
+    return value.model_dump(mode="json")
+
+# Converter per exact type, resolved on first sight so repeat values skip the attribute probe
+_JSON_CONVERTERS = {MappingProxyType: dict}
+
+def _json_default(value):
+    """Serialize tool results orjson cannot handle natively, such as Beanie documents"""
+    value_type = type(value)
+    convert = _JSON_CONVERTERS.get(value_type)
+    if convert is None:
+        convert = _model_dump_json if hasattr(value, "model_dump") else str
+        _JSON_CONVERTERS[value_type] = convert
+    return convert(value)
+
+SSE_DONE_PREFIX = b'data: {"done":true,"session_id":'
+
+def done_frame(session_id: str) -> bytes:
+    """Encode the end-of-stream frame without building a dict per stream"""
+    return SSE_DONE_PREFIX + orjson.dumps(session_id) + b"}\n\n"
+
+def content_frame_encoder(session_id: str):
+    """Build a content frame encoder with the static session_id part serialized once"""
+    prefix = b'data: {"session_id":' + orjson.dumps(session_id) + b',"content":'
+    
+    def encode(content: str) -> bytes:
+        return prefix + orjson.dumps(content) + b"}\n\n"
+    
+    return encode
+
+# Per-session memory shared by all requests; idle sessions expire after an hour
+conversation_memory = TTLCache(maxsize=10_000, ttl=3600)
+
+# Conversation context limits
+HISTORY_WINDOW = 6          # most recent messages kept verbatim
+SUMMARY_MAX_CHARS = 800     # roughly 200 tokens of older context
+MAX_INPUT_TOKENS = 2000
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Cheap token estimate (about 4 characters per token)"""
+    return len(text or "") // 4 + 1
+
+def _fold_into_summary(summary: str, message: Dict) -> str:
+    """Fold a message evicted from the recent window into the running summary"""
+    entry = f"{message['role']}: {message['content'] or ''}"
+    folded = f"{summary} | {entry}" if summary else entry
+    # Keep the newest context when the summary grows past its budget
+    return folded[-SUMMARY_MAX_CHARS:]
+
+# Questions that map 1:1 onto a static tool are answered without calling OpenAI.
+# Each pattern names only the subject; INTENT_PATTERN anchors it to a whole message
+INTENT_ROUTES = {
+    "cafeteria": (
+        r"(?:cafeteria|canteen)(?:\s+(?:opening\s+)?(?:hours|timings?|times|schedule)|\s+open|\s+close)"
+        r"|(?:opening\s+)?(?:hours|timings?)\s+(?:of|for)\s+the\s+(?:cafeteria|canteen)",
+        "get_cafeteria_timings",
+        "Here are the cafeteria timings:\n{details}"
+    ),
+    "library": (
+        r"library(?:\s+(?:opening\s+)?(?:hours|timings?|times|schedule)|\s+open|\s+close)"
+        r"|(?:opening\s+)?(?:hours|timings?)\s+(?:of|for)\s+the\s+library",
+        "get_library_hours",
+        "Here are the library hours:\n{details}"
+    ),
+    "events": (
+        r"(?:upcoming\s+)?(?:campus\s+)?events?(?:\s+schedule)?",
+        "get_event_schedule",
+        "Here are the upcoming campus events:\n{details}"
+    ),
+}
+
+# A message is routed only when it is nothing but one of these questions, e.g.
+# "library hours?" or "When does the cafeteria close today?"
+INTENT_QUESTION_LEAD = r"\s*(?:(?:what\s+(?:are|is)|what's|when\s+(?:is|does|do)|is|are|any)\s+)?(?:the\s+)?"
+INTENT_QUESTION_TAIL = r"(?:\s+(?:today|now|tomorrow|this\s+week|on\s+weekends?|on\s+weekdays))?(?:,?\s*please)?\s*[?.!]*\s*"
+INTENT_PATTERN = re.compile(
+    INTENT_QUESTION_LEAD
+    + "(?:" + "|".join(f"(?P<{name}>{pattern})" for name, (pattern, _, _) in INTENT_ROUTES.items()) + ")"
+    + INTENT_QUESTION_TAIL,
+    re.IGNORECASE
+)
+
+# Messages asking for something to be done always go to the model
+ACTION_PATTERN = re.compile(r"\b(send|e-?mail|add|update|change|delete|remove|tell)\b", re.IGNORECASE)
+
+COMPLEX_QUERY_PATTERN = re.compile(
+    r"\b(analy[sz]e|compare|explain|why|summari[sz]e|trend|recommend|plan)\b",
+    re.IGNORECASE
+)
+
+# Word plus trailing whitespace, the unit replies are replayed in
+REPLAY_CHUNK_PATTERN = re.compile(r"\S+\s*")
+
+def select_model(message: str) -> str:
+    """Pick the cheapest model likely to handle the message well"""
+    if len(message) > 600 or COMPLEX_QUERY_PATTERN.search(message):
+        return CHAT_MODEL_COMPLEX
+    if len(message) < 120:
+        return CHAT_MODEL_SIMPLE
+    return CHAT_MODEL
+
+def _format_details(value) -> str:
+    """Render a tool result as plain text for a direct answer"""
+    if isinstance(value, Mapping):
+        return "\n".join(
+            f"{key.replace('_', ' ').capitalize()}: {_format_details(item)}"
+            for key, item in value.items() if key != "success"
+        )
+    if isinstance(value, (list, tuple)):
+        return "\n".join(
+            f"- {', '.join(str(v) for v in item.values()) if isinstance(item, Mapping) else item}"
+            for item in value
+        )
+    return str(value)
+
+class LLMCache:
+    """Cache of final assistant replies keyed on the exact OpenAI request"""
+
+    def __init__(self, maxsize: int = 1024, ttl: int = LLM_CACHE_TTL):
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], tools_json: bytes) -> str:
+        payload = model.encode() + orjson.dumps(messages, option=orjson.OPT_SORT_KEYS) + tools_json
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, response: str, ttl: Optional[int] = None):
+        self._cache.set(key, response, ttl)
+
+    def ttl_for(self, function_names: List[str]) -> Optional[int]:
+        """Get the TTL for a reply, or None if it must not be cached"""
+        if not function_names:
+            return self.ttl
+        if not all(name in CACHEABLE_FUNCTIONS for name in function_names):
+            return None
+        return min(CACHEABLE_FUNCTIONS[name] for name in function_names)
+
+llm_cache = LLMCache()
+
+# OpenAI requests currently running, keyed like the reply cache
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Function schemas for OpenAI
+FUNCTION_SCHEMAS = [
+    {
+        "name": "add_student",
+        "description": "Add a new student to the campus database",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "Student's full name"},
+                "student_id": {"type": "string", "description": "Student ID"},
+                "department": {"type": "string", "description": "Student's department"},
+                "email": {"type": "string", "description": "Student's email address"}
             },
-            {
-                "name": "get_cafeteria_timings",
-                "description": "Get cafeteria operating hours",
-                "parameters": {"type": "object", "properties": {}}
+            "required": ["name", "student_id", "department", "email"]
+        }
+    },
+    {
+        "name": "get_student",
+        "description": "Get student information by ID",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "student_id": {"type": "string", "description": "Student ID"}
             },
-            {
-                "name": "get_library_hours",
-                "description": "Get library operating hours",
-                "parameters": {"type": "object", "properties": {}}
+            "required": ["student_id"]
+        }
+    },
+    {
+        "name": "update_student",
+        "description": "Update a student's information",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "student_id": {"type": "string", "description": "Student ID"},
+                "name": {"type": "string", "description": "New full name"},
+                "department": {"type": "string", "description": "New department"},
+                "email": {"type": "string", "description": "New email address"}
             },
-            {
-                "name": "get_event_schedule",
-                "description": "Get upcoming campus events",
-                "parameters": {"type": "object", "properties": {}}
+            "required": ["student_id"]
+        }
+    },
+    {
+        "name": "delete_student",
+        "description": "Delete a student from the database",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "student_id": {"type": "string", "description": "Student ID"}
             },
-            {
-                "name": "send_email",
-                "description": "Send an email to a student",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "student_id": {"type": "string", "description": "Student ID"},
-                        "message": {"type": "string", "description": "Email message content"}
-                    },
-                    "required": ["student_id", "message"]
-                }
+            "required": ["student_id"]
+        }
+    },
+    {
+        "name": "list_students",
+        "description": "List all students in the database",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "get_total_students",
+        "description": "Get the total number of students",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "get_students_by_department",
+        "description": "Get student count grouped by department",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "get_recent_onboarded_students",
+        "description": "Get recently onboarded students",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "limit": {"type": "integer", "description": "Number of students to return", "default": 5}
             }
-        ]
+        }
+    },
+    {
+        "name": "get_active_students_last_7_days",
+        "description": "Get count of active students in the last 7 days",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "get_cafeteria_timings",
+        "description": "Get cafeteria operating hours",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "get_library_hours",
+        "description": "Get library operating hours",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "get_event_schedule",
+        "description": "Get upcoming campus events",
+        "parameters": {"type": "object", "properties": {}}
+    },
+    {
+        "name": "send_email",
+        "description": "Send an email to a student",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "student_id": {"type": "string", "description": "Student ID"},
+                "message": {"type": "string", "description": "Email message content"}
+            },
+            "required": ["student_id", "message"]
+        }
+    }
+]
+
+# Same schemas in the tools format, which allows parallel tool calls
+TOOL_SCHEMAS = [{"type": "function", "function": schema} for schema in FUNCTION_SCHEMAS]
+TOOL_SCHEMAS_JSON = orjson.dumps(TOOL_SCHEMAS)
+
+# The only tool methods the model is allowed to call
+FUNCTION_NAMES = frozenset(schema["name"] for schema in FUNCTION_SCHEMAS)
+
+class CampusAgent:
+    def __init__(self, db: AsyncIOMotorClient):
+        self.db = db
+        self.tools = CampusTools(db)
+        self.client = get_openai_client()
+        self._dispatch = {
+            name: getattr(self.tools, name)
+            for name in FUNCTION_NAMES
+            if hasattr(self.tools, name)
+        }
+        # The model sends student fields flat; these tools take request models
+        self._dispatch["add_student"] = self._add_student
+        self._dispatch["update_student"] = self._update_student
+        self._async_functions = frozenset(
+            name for name, method in self._dispatch.items()
+            if inspect.iscoroutinefunction(method)
+        )
     
-    def _execute_function(self, function_name: str, arguments: Dict) -> Dict:
+    async def _add_student(self, **fields):
+        """Add a student from the flat fields the model sends"""
+        return await self.tools.add_student(StudentCreate(**fields))
+    
+    async def _update_student(self, student_id: str, **fields):
+        """Update a student with only the fields the model sent"""
+        return await self.tools.update_student(student_id, StudentUpdate(**fields))
+    
+    async def _execute_function(self, function_name: str, arguments: Dict) -> Dict:
         """Execute a function call with the given arguments"""
+        method = self._dispatch.get(function_name)
+        if method is None:
+            return {"success": False, "message": f"Function {function_name} not found"}
+        
         try:
-            if hasattr(self.tools, function_name):
-                method = getattr(self.tools, function_name)
-                result = method(**arguments)
-                return result
-            else:
-                return {"success": False, "message": f"Function {function_name} not found"}
+            if function_name in self._async_functions:
+                return await method(**arguments)
+            # The synchronous tools only return in-memory constants, so call them inline
+            return method(**arguments)
         except Exception as e:
             return {"success": False, "message": f"Error executing {function_name}: {str(e)}"}
     
-    def _get_conversation_history(self, session_id: str) -> List[Dict]:
-        """Get conversation history for a session"""
-        if session_id not in self.conversation_memory:
-            # Load from database
-            conversations = self.db.query(Conversation).filter(
+    async def _run_tool_calls(self, messages: List[Dict], tool_calls) -> List[str]:
+        """Execute the requested tool calls concurrently and add their results to messages"""
+        results = await asyncio.gather(*[
+            self._execute_function(tool_call.function.name, orjson.loads(tool_call.function.arguments))
+            for tool_call in tool_calls
+        ])
+        
+        messages.append({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments
+                    }
+                }
+                for tool_call in tool_calls
+            ]
+        })
+        for tool_call, result in zip(tool_calls, results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": orjson.dumps(result, default=_json_default).decode()
+            })
+        
+        return [tool_call.function.name for tool_call in tool_calls]
+    
+    def _intent_route(self, message: str) -> Optional[tuple]:
+        """Match a message that is only a campus info question against the direct-answer routes"""
+        if ACTION_PATTERN.search(message) or COMPLEX_QUERY_PATTERN.search(message):
+            return None
+        
+        match = INTENT_PATTERN.fullmatch(message)
+        if match is None:
+            return None
+        
+        _, function_name, template = INTENT_ROUTES[match.lastgroup]
+        return function_name, {}, template
+    
+    async def _direct_answer(self, message: str) -> Optional[str]:
+        """Answer simple questions straight from a tool, skipping the LLM"""
+        route = self._intent_route(message)
+        if route is None:
+            return None
+        
+        function_name, arguments, template = route
+        result = await self._execute_function(function_name, arguments)
+        if isinstance(result, dict) and result.get("success") is False:
+            return None
+        
+        return template.format(details=_format_details(result))
+    
+    def _replay(self, text: str, content_frame):
+        """Split a ready-made reply into word chunks so clients see the same stream"""
+        for content in REPLAY_CHUNK_PATTERN.findall(text):
+            yield content_frame(content)
+    
+    def _remember(self, memory: Dict, message: Dict):
+        """Add a message to session memory, summarizing whatever falls out of the window"""
+        recent = memory["recent"]
+        if len(recent) == recent.maxlen:
+            memory["summary"] = _fold_into_summary(memory["summary"], recent[0])
+        recent.append(message)
+    
+    async def _get_conversation_history(self, session_id: str) -> Dict:
+        """Get the conversation summary and recent messages for a session"""
+        memory = conversation_memory.get(session_id)
+        if memory is not None:
+            # Another worker may have answered this session since it was cached;
+            # the (session_id, timestamp) index makes this check a single key lookup
+            newer = [Conversation.session_id == session_id]
+            if memory["latest"] is not None:
+                newer.append(Conversation.timestamp > memory["latest"])
+            if await Conversation.find(*newer).limit(1).project(ConversationTurn).to_list():
+                memory = None
+        
+        if memory is None:
+            memory = {"summary": "", "recent": deque(maxlen=HISTORY_WINDOW), "latest": None}
+            
+            # Load only the latest turns from the database, newest first, and only
+            # the message/response fields
+            conversations = await Conversation.find(
                 Conversation.session_id == session_id
-            ).order_by(Conversation.timestamp).limit(10).all()
+            ).sort(-Conversation.timestamp).limit(10).project(ConversationTurn).to_list()
             
-            history = []
-            for conv in conversations:
-                history.append({"role": "user", "content": conv.message})
-                history.append({"role": "assistant", "content": conv.response})
+            for conv in reversed(conversations):
+                self._remember(memory, {"role": "user", "content": conv.message})
+                self._remember(memory, {"role": "assistant", "content": conv.response})
+            if conversations:
+                memory["latest"] = conversations[0].timestamp
             
-            self.conversation_memory[session_id] = history
+            conversation_memory.set(session_id, memory)
         
-        return self.conversation_memory[session_id]
+        return memory
+    
+    def _build_messages(self, memory: Dict, message: str) -> List[Dict]:
+        """Build the OpenAI messages for a turn within the input token budget"""
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if memory["summary"]:
+            messages.append({"role": "system", "content": f"Prior summary: {memory['summary']}"})
+        
+        # Drop the oldest recent messages until everything fits the budget
+        budget = (
+            MAX_INPUT_TOKENS
+            - estimate_tokens(SYSTEM_PROMPT)
+            - estimate_tokens(memory["summary"])
+            - estimate_tokens(message)
+        )
+        recent = list(memory["recent"])
+        while recent and sum(estimate_tokens(m["content"]) for m in recent) > budget:
+            recent.pop(0)
+        
+        messages.extend(recent)
+        messages.append({"role": "user", "content": message})
+        return messages
     
     def _save_conversation(self, session_id: str, message: str, response: str):
-        """Save conversation to database and memory"""
+        """Queue conversation for saving and update memory"""
         try:
             conversation = Conversation(
                 session_id=session_id,
                 message=message,
                 response=response
             )
-            self.db.add(conversation)
-            self.db.commit()
+            conversation_writer.put(conversation)
             
-            # Update memory
-            if session_id not in self.conversation_memory:
-                self.conversation_memory[session_id] = []
+            # Update memory; sessions not loaded yet pick this turn up from the database
+            memory = conversation_memory.get(session_id)
+            if memory is not None:
+                self._remember(memory, {"role": "user", "content": message})
+                self._remember(memory, {"role": "assistant", "content": response})
+                memory["latest"] = conversation.timestamp
+                # Re-store to restart the expiry clock for active sessions
+                conversation_memory.set(session_id, memory)
             
-            self.conversation_memory[session_id].append({"role": "user", "content": message})
-            self.conversation_memory[session_id].append({"role": "assistant", "content": response})
+        except Exception as e:
+            ai_logger.error("Error saving conversation: %s", e)
+    
+    async def _complete(self, cache_key: str, model: str, messages: List[Dict]) -> Optional[str]:
+        """Get the final reply from OpenAI, running any requested tools, and cache it"""
+        # Call OpenAI API
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=TOOL_SCHEMAS,
+            tool_choice="auto",
+            temperature=0.7,
+            max_tokens=1000
+        )
+        
+        response_message = response.choices[0].message
+        function_names = []
+        
+        # Check if the model wants to call any tools
+        if response_message.tool_calls:
+            function_names = await self._run_tool_calls(messages, response_message.tool_calls)
             
-            # Keep only last 20 messages in memory
-            if len(self.conversation_memory[session_id]) > 20:
-                self.conversation_memory[session_id] = self.conversation_memory[session_id][-20:]
-                
+            # Get final response from OpenAI
+            final_response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000
+            )
+            
+            final_message = final_response.choices[0].message.content
+        else:
+            final_message = response_message.content
+        
+        cache_ttl = llm_cache.ttl_for(function_names)
+        if cache_ttl is not None and final_message:
+            llm_cache.set(cache_key, final_message, cache_ttl)
+        
+        return final_message
+    
+    async def _complete_once(self, cache_key: str, model: str, messages: List[Dict]) -> Optional[str]:
+        """Complete a request, sharing one upstream call between identical concurrent requests"""
+        while cache_key in _inflight:
+            inflight = _inflight[cache_key]
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The request that owned the call was cancelled, not this one;
+                # make (or join) a fresh call instead of failing
+        
+        future = asyncio.get_running_loop().create_future()
+        # Mark the result as retrieved even when nobody else ended up waiting on it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        _inflight[cache_key] = future
+        try:
+            final_message = await self._complete(cache_key, model, messages)
+            future.set_result(final_message)
+            return final_message
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
         except Exception as e:
-            print(f"Error saving conversation: {e}")
+            future.set_exception(e)
+            raise
+        finally:
+            del _inflight[cache_key]
     
-    def chat(self, message: str, session_id: Optional[str] = None) -> Dict:
+    async def chat(self, message: str, session_id: Optional[str] = None) -> Dict:
         """Process a chat message and return response"""
         if not session_id:
             session_id = str(uuid.uuid4())
         
         try:
-            # Get conversation history
-            history = self._get_conversation_history(session_id)
-            
-            # Prepare messages for OpenAI
-            messages = [
-                {
-                    "role": "system",
-                    "content": """You are a helpful Campus Admin Agent AI assistant. You can help with:
-                    
-1. Student Management: Add, update, delete, and retrieve student information
-2. Campus Analytics: Provide statistics about students, departments, and activities
-3. Campus Information: Share details about cafeteria timings, library hours, and events
-4. Communication: Send emails to students (mock implementation)
-
-You have access to various tools to interact with the campus database. Always be helpful, professional, and provide accurate information. When users ask for student operations, use the appropriate tools to perform the requested actions.
-
-If you need to perform any database operations, use the available function calls. Always confirm successful operations and provide clear feedback to users."""
+            direct_answer = await self._direct_answer(message)
+            if direct_answer is not None:
+                self._save_conversation(session_id, message, direct_answer)
+                return {
+                    "response": direct_answer,
+                    "session_id": session_id,
+                    "success": True
                 }
-            ]
-            
-            # Add conversation history
-            messages.extend(history)
             
-            # Add current message
-            messages.append({"role": "user", "content": message})
+            # Get conversation history
+            memory = await self._get_conversation_history(session_id)
             
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                functions=self.function_schemas,
-                function_call="auto",
-                temperature=0.7,
-                max_tokens=1000
-            )
+            # Prepare messages for OpenAI
+            messages = self._build_messages(memory, message)
             
-            response_message = response.choices[0].message
+            model = select_model(message)
+            cache_key = llm_cache.make_key(model, messages, TOOL_SCHEMAS_JSON)
+            final_message = llm_cache.get(cache_key)
             
-            # Check if the model wants to call a function
-            if response_message.function_call:
-                function_name = response_message.function_call.name
-                function_args = json.loads(response_message.function_call.arguments)
-                
-                # Execute the function
-                function_result = self._execute_function(function_name, function_args)
-                
-                # Add function call and result to messages
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "function_call": {
-                        "name": function_name,
-                        "arguments": response_message.function_call.arguments
-                    }
-                })
-                messages.append({
-                    "role": "function",
-                    "name": function_name,
-                    "content": json.dumps(function_result)
-                })
-                
-                # Get final response from OpenAI
-                final_response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=1000
-                )
-                
-                final_message = final_response.choices[0].message.content
-            else:
-                final_message = response_message.content
+            if final_message is None:
+                final_message = await self._complete_once(cache_key, model, messages)
             
             # Save conversation
             self._save_conversation(session_id, message, final_message)
@@ -279,118 +671,94 @@ If you need to perform any database operations, use the available function calls
                 "error": str(e)
             }
     
-    async def chat_stream(self, message: str, session_id: Optional[str] = None) -> AsyncGenerator[str, None]:
+    async def chat_stream(self, message: str, session_id: Optional[str] = None) -> AsyncGenerator[bytes, None]:
         """Process a chat message and return streaming response"""
         if not session_id:
             session_id = str(uuid.uuid4())
+        content_frame = content_frame_encoder(session_id)
         
         try:
+            direct_answer = await self._direct_answer(message)
+            if direct_answer is not None:
+                for frame in self._replay(direct_answer, content_frame):
+                    yield frame
+                
+                self._save_conversation(session_id, message, direct_answer)
+                yield done_frame(session_id)
+                return
+            
             # Get conversation history
-            history = self._get_conversation_history(session_id)
+            memory = await self._get_conversation_history(session_id)
             
             # Prepare messages for OpenAI
-            messages = [
-                {
-                    "role": "system",
-                    "content": """You are a helpful Campus Admin Agent AI assistant. You can help with:
-                    
-1. Student Management: Add, update, delete, and retrieve student information
-2. Campus Analytics: Provide statistics about students, departments, and activities
-3. Campus Information: Share details about cafeteria timings, library hours, and events
-4. Communication: Send emails to students (mock implementation)
-
-You have access to various tools to interact with the campus database. Always be helpful, professional, and provide accurate information. When users ask for student operations, use the appropriate tools to perform the requested actions."""
-                }
-            ]
+            messages = self._build_messages(memory, message)
             
-            # Add conversation history
-            messages.extend(history)
+            model = select_model(message)
+            cache_key = llm_cache.make_key(model, messages, TOOL_SCHEMAS_JSON)
+            cached_response = llm_cache.get(cache_key)
             
-            # Add current message
-            messages.append({"role": "user", "content": message})
+            if cached_response is not None:
+                for frame in self._replay(cached_response, content_frame):
+                    yield frame
+                
+                self._save_conversation(session_id, message, cached_response)
+                yield done_frame(session_id)
+                return
             
             # First, check if we need to call functions
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+            response = await self.client.chat.completions.create(
+                model=model,
                 messages=messages,
-                functions=self.function_schemas,
-                function_call="auto",
+                tools=TOOL_SCHEMAS,
+                tool_choice="auto",
                 temperature=0.7,
                 max_tokens=1000
             )
             
             response_message = response.choices[0].message
+            function_names = []
             
-            # Check if the model wants to call a function
-            if response_message.function_call:
-                function_name = response_message.function_call.name
-                function_args = json.loads(response_message.function_call.arguments)
-                
-                # Execute the function
-                function_result = self._execute_function(function_name, function_args)
-                
-                # Add function call and result to messages
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "function_call": {
-                        "name": function_name,
-                        "arguments": response_message.function_call.arguments
-                    }
-                })
-                messages.append({
-                    "role": "function",
-                    "name": function_name,
-                    "content": json.dumps(function_result)
-                })
-                
-                # Stream the final response
-                stream = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=1000,
-                    stream=True
-                )
-                
-                full_response = ""
-                for chunk in stream:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        full_response += content
-                        yield f"data: {json.dumps({'content': content, 'session_id': session_id})}\n\n"
-                
-                # Save conversation
-                self._save_conversation(session_id, message, full_response)
-                
-            else:
-                # Stream the direct response
-                stream = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=1000,
-                    stream=True
-                )
-                
-                full_response = ""
-                for chunk in stream:
-                    if chunk.choices[0].delta.content is not None:
-                        content = chunk.choices[0].delta.content
-                        full_response += content
-                        yield f"data: {json.dumps({'content': content, 'session_id': session_id})}\n\n"
-                
-                # Save conversation
-                self._save_conversation(session_id, message, full_response)
+            # Check if the model wants to call any tools
+            if response_message.tool_calls:
+                function_names = await self._run_tool_calls(messages, response_message.tool_calls)
+            
+            # Stream the final response
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True
+            )
+            
+            full_response = ""
+            async for chunk in stream:
+                if chunk.choices[0].delta.content is not None:
+                    content = chunk.choices[0].delta.content
+                    full_response += content
+                    yield content_frame(content)
+            
+            # Save conversation
+            self._save_conversation(session_id, message, full_response)
+            
+            cache_ttl = llm_cache.ttl_for(function_names)
+            if cache_ttl is not None and full_response:
+                llm_cache.set(cache_key, full_response, cache_ttl)
             
             # Send end signal
-            yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
+            yield done_frame(session_id)
             
         except Exception as e:
             error_message = f"I apologize, but I encountered an error: {str(e)}"
-            yield f"data: {json.dumps({'content': error_message, 'error': True, 'session_id': session_id})}\n\n"
-            yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
+            yield sse_event({"content": error_message, "error": True, "session_id": session_id})
+            yield done_frame(session_id)
+
+_agent: Optional[CampusAgent] = None
 
-def get_agent(db: Session) -> CampusAgent:
-    """Get campus agent instance"""
-    return CampusAgent(db)
+def get_agent(db: AsyncIOMotorClient) -> CampusAgent:
+    """Get the shared campus agent instance"""
+    global _agent
+    # The database client is shared for the whole process, so one agent serves every request
+    if _agent is None or _agent.db is not db:
+        _agent = CampusAgent(db)
+    return _agent
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
 from enum import Enum
 
@@ -19,12 +19,11 @@ class UserLogin(BaseModel):
     password: str
 
 class UserResponse(UserBase):
+    model_config = ConfigDict(extra="ignore", from_attributes=True, populate_by_name=True)
+
     id: int
     is_active: bool
 
-    class Config:
-        from_attributes = True
-
 class Token(BaseModel):
     access_token: str
     token_type: str
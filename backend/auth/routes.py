@@ -40,13 +40,14 @@ async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = security.get_user(db, email=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    user = security.get_login_user(db, email=form_data.username)
+    if not user or not await security.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    security.remember_login(user)
     
     access_token_expires = timedelta(minutes=security.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
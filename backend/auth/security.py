@@ -2,11 +2,14 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+import asyncio
 import os
+import time
 
+from ..cache import TTLCache
 from ..db import get_db
 from .models import UserRole, TokenData, User
 
@@ -15,12 +18,25 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-for-jwt")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; new hashes use argon2, existing bcrypt hashes still verify
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__rounds=2,
+    argon2__memory_cost=19456
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Users who logged in successfully in the last 30 seconds, keyed by email
+_recent_logins = TTLCache(maxsize=1024, ttl=30)
+
+# Authenticated users keyed by raw token, so the JWT is decoded and the
+# user fetched at most once a minute per token
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    # Hash verification is CPU-bound, so keep it off the event loop
+    return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -38,10 +54,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 def get_user(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
+def get_login_user(db: Session, email: str):
+    """Get a user for login, reusing recent successful logins"""
+    user = _recent_logins.get(email)
+    if user is None:
+        user = get_user(db, email=email)
+    return user
+
+def remember_login(user):
+    _recent_logins.set(user.email, user)
+
 async def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
+    # Resolved at most once per request, whoever asks first
+    request_user = getattr(request.state, "current_user", None)
+    if request_user is not None:
+        return request_user
+    
+    cached_user = _token_cache.get(token)
+    if cached_user is not None:
+        request.state.current_user = cached_user
+        return cached_user
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -59,6 +96,12 @@ async def get_current_user(
     user = get_user(db, email=token_data.email)
     if user is None:
         raise credentials_exception
+    
+    # Never cache a user past the token's own expiry
+    seconds_left = payload["exp"] - time.time() if "exp" in payload else _token_cache.ttl
+    if seconds_left > 0:
+        _token_cache.set(token, user, min(_token_cache.ttl, seconds_left))
+    request.state.current_user = user
     return user
 
 async def get_current_active_user(
@@ -69,8 +112,12 @@ async def get_current_active_user(
     return current_user
 
 def check_role(required_role: UserRole):
+    # UserRole is a str enum, so members hash and compare by value and raw role
+    # strings match them too
+    allowed_roles = frozenset({required_role, UserRole.ADMIN})
+    
     async def role_checker(current_user = Depends(get_current_active_user)):
-        if current_user.role != required_role and current_user.role != UserRole.ADMIN:
+        if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Operation requires {required_role} role"
@@ -1,8 +1,13 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from beanie import init_beanie
+from beanie import Document, PydanticObjectId, init_beanie
+from pymongo.errors import BulkWriteError
+from typing import List, Optional, Type
+from datetime import timezone
+import asyncio
 import os
 from dotenv import load_dotenv
 
+from .logging_config import db_logger
 from .models import User, Student, ActivityLog, Conversation
 
 # Load environment variables
@@ -12,12 +17,29 @@ load_dotenv()
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "campus_ai_agent")
 
-async def init_mongodb():
-    """Initialize MongoDB connection and Beanie ODM"""
+# Shared client for the lifetime of the process; motor pools connections internally
+_client: Optional[AsyncIOMotorClient] = None
+
+async def init_mongodb() -> AsyncIOMotorClient:
+    """Initialize MongoDB connection and Beanie ODM once per process"""
+    global _client
+    if _client is not None:
+        return _client
+    
     # Create motor client
-    client = AsyncIOMotorClient(MONGODB_URL)
+    client = AsyncIOMotorClient(
+        MONGODB_URL,
+        maxPoolSize=100,
+        minPoolSize=10,
+        maxIdleTimeMS=30000,           # recycle idle sockets before they go stale
+        serverSelectionTimeoutMS=3000, # fail fast when the server is unreachable
+        waitQueueTimeoutMS=2000,       # bound the wait for a free pooled connection
+        retryWrites=True,
+        tz_aware=True,                 # read datetimes back as aware UTC, like utc_now() writes them
+        tzinfo=timezone.utc
+    )
     
-    # Initialize beanie with the document models
+    # Initialize beanie with the document models (also creates their indexes)
     await init_beanie(
         database=client[DATABASE_NAME],
         document_models=[
@@ -28,17 +50,138 @@ async def init_mongodb():
         ]
     )
     
-    return client
+    _client = client
+    return _client
 
-async def close_mongodb(client: AsyncIOMotorClient):
+async def close_mongodb():
     """Close MongoDB connection"""
-    client.close()
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
 
 # Database dependency
 async def get_db():
-    """Get database client"""
-    client = await init_mongodb()
-    try:
-        yield client
-    finally:
-        await close_mongodb(client)
+    """Get the shared database client"""
+    yield await init_mongodb()
+
+# MongoDB error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+# Queued by stop() so the flusher saves what it holds and exits
+_STOP = object()
+
+class DocumentWriter:
+    """Write-behind buffer that batches inserts of one document model off the request path"""
+    
+    def __init__(
+        self,
+        document_model: Type[Document],
+        batch_size: int = 50,
+        flush_interval: float = 0.2,
+        max_attempts: int = 3,
+        retry_delay: float = 0.5
+    ):
+        self.document_model = document_model
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+    
+    def put(self, document: Document):
+        """Queue a document for saving; never waits on the database"""
+        self.start()
+        self._queue.put_nowait(document)
+    
+    async def stop(self):
+        """Save everything queued or in flight, then stop the flusher"""
+        if self._task is None:
+            return
+        
+        self._queue.put_nowait(_STOP)
+        await self._task
+        
+        self._task = None
+        self._queue = None
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                item = await self._queue.get()
+                stopping = item is _STOP
+                if not stopping:
+                    batch.append(item)
+                deadline = loop.time() + self.flush_interval
+                
+                # Collect up to batch_size items or until the flush interval passes
+                while not stopping and len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                
+                if batch:
+                    await self._flush(batch)
+                    batch = []
+                if stopping:
+                    return
+        except asyncio.CancelledError:
+            # Cancelled from outside (e.g. loop teardown); save what was already dequeued
+            if batch:
+                await self._flush(batch)
+            raise
+    
+    async def _flush(self, batch: List[Document]):
+        # Ids are fixed before the first attempt so a retry after a partial write
+        # reports the saved documents as duplicates instead of inserting them twice
+        for document in batch:
+            if document.id is None:
+                document.id = PydanticObjectId()
+        
+        pending = batch
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self.document_model.insert_many(pending, ordered=False)
+                return
+            except BulkWriteError as e:
+                failed = {
+                    write_error["index"] for write_error in e.details["writeErrors"]
+                    if write_error["code"] != DUPLICATE_KEY_ERROR
+                }
+                pending = [document for index, document in enumerate(pending) if index in failed]
+                if not pending:
+                    return
+                error = e
+            except Exception as e:
+                error = e
+            
+            if attempt < self.max_attempts:
+                db_logger.warning(
+                    "Retrying %s %s documents after error: %s",
+                    len(pending), self.document_model.__name__, error
+                )
+                await asyncio.sleep(self.retry_delay * attempt)
+        
+        db_logger.error(
+            "Error saving %s %s documents: %s", len(pending), self.document_model.__name__, error
+        )
+
+conversation_writer = DocumentWriter(Conversation)
+activity_writer = DocumentWriter(ActivityLog)
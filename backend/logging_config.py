@@ -1,20 +1,137 @@
+import atexit
 import logging
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
 import os
 
 # Create logs directory if it doesn't exist
 logs_dir = Path("logs")
 logs_dir.mkdir(exist_ok=True)
 
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders the timestamp once per second instead of per record"""
+    
+    _cached = (None, None, "")  # (second, datefmt, formatted time)
+    
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        second = int(record.created)
+        cached_second, cached_datefmt, formatted = self._cached
+        if second != cached_second or datefmt != cached_datefmt:
+            formatted = time.strftime(datefmt or self.default_time_format, self.converter(second))
+            self._cached = (second, datefmt, formatted)
+        
+        if datefmt:
+            return formatted
+        return self.default_msec_format % (formatted, record.msecs)
+
 # Configure logging format
-log_format = logging.Formatter(
+log_format = CachedTimeFormatter(
     '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that batches writes and shifts backups off-thread"""
+    
+    def __init__(self, *args, buffer_size: int = 64 * 1024, flush_interval: float = 0.2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._timer: Optional[threading.Timer] = None
+        self._rotation_lock = threading.Lock()
+    
+    def emit(self, record: logging.LogRecord):
+        # Called by handle() with the handler lock held
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+        
+        self._buffer.append(msg)
+        self._buffered += len(msg)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self):
+        """Write buffered records to the file, rolling over first if needed"""
+        self.acquire()
+        try:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            
+            if self._buffer:
+                data = "".join(self._buffer)
+                self._buffer.clear()
+                self._buffered = 0
+                
+                if self.stream is None:
+                    self.stream = self._open()
+                if self.maxBytes > 0 and 0 < self.stream.tell() and self.stream.tell() + len(data) >= self.maxBytes:
+                    self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                self.stream.write(data)
+            
+            super().flush()
+        finally:
+            self.release()
+    
+    def doRollover(self):
+        """Swap in a fresh log file now and shift the old backups in the background"""
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        
+        if self.backupCount > 0 and os.path.exists(self.baseFilename):
+            # A single rename keeps the swap cheap; numbering happens off-thread
+            pending = f"{self.baseFilename}.{time.time_ns()}.pending"
+            os.rename(self.baseFilename, pending)
+            threading.Thread(
+                target=self._shift_backups, args=(pending,), name="log-rotation"
+            ).start()
+        
+        if not self.delay:
+            self.stream = self._open()
+    
+    def _shift_backups(self, pending: str):
+        with self._rotation_lock:
+            for i in range(self.backupCount - 1, 0, -1):
+                source = self.rotation_filename(f"{self.baseFilename}.{i}")
+                dest = self.rotation_filename(f"{self.baseFilename}.{i + 1}")
+                if os.path.exists(source):
+                    if os.path.exists(dest):
+                        os.remove(dest)
+                    os.rename(source, dest)
+            self.rotate(pending, self.rotation_filename(f"{self.baseFilename}.1"))
+    
+    def close(self):
+        self.flush()
+        super().close()
+
+# Loggers only enqueue records; a background listener thread does the I/O
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+
+console_handler = logging.StreamHandler(sys.stdout)
+console_handler.setFormatter(log_format)
+
+log_listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 def setup_logger(name: str, level=logging.INFO) -> logging.Logger:
-    """Set up a logger with both file and console handlers"""
+    """Set up a logger that writes to its own file and the console via the log queue"""
     logger = logging.getLogger(name)
     logger.setLevel(level)
     
@@ -22,19 +139,17 @@ def setup_logger(name: str, level=logging.INFO) -> logging.Logger:
     if logger.handlers:
         return logger
     
-    # File handler with rotation
-    file_handler = RotatingFileHandler(
+    # File handler with rotation, limited to this logger's records
+    file_handler = BufferedRotatingFileHandler(
         logs_dir / f"{name}.log",
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5
     )
     file_handler.setFormatter(log_format)
-    logger.addHandler(file_handler)
+    file_handler.addFilter(logging.Filter(name))
+    log_listener.handlers = (*log_listener.handlers, file_handler)
     
-    # Console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(log_format)
-    logger.addHandler(console_handler)
+    logger.addHandler(QueueHandler(log_queue))
     
     return logger
 
@@ -1,33 +1,51 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
-from sse_starlette.sse import EventSourceResponse
+from datetime import datetime
 from typing import List, Optional
-import asyncio
-import json
+import logging
+import orjson
+import os
 import time
 from contextlib import asynccontextmanager
 
 from .errors import BaseAppException
 from .logging_config import api_logger, setup_logger
-from .db import get_db
+from .db import get_db, init_mongodb, close_mongodb, conversation_writer, activity_writer
 from .models import (
-    StudentCreate, StudentUpdate, StudentResponse, 
+    StudentCreate, StudentUpdate, StudentResponse, BulkStudentResponse,
     ChatMessage, ChatResponse, AnalyticsResponse,
-    EmailRequest, EmailResponse, ActivityLogCreate
+    EmailRequest, EmailResponse, ActivityLogCreate,
+    MAX_CHAT_MESSAGE_LENGTH
 )
-from .tools_new import get_campus_tools, CampusTools
-from .agent import ChatAgent
+from .tools_new import (
+    get_campus_tools, CampusTools, DEFAULT_PAGE_SIZE,
+    CAFETERIA_TIMINGS, LIBRARY_HOURS, EVENT_SCHEDULE
+)
+from .agent import CampusAgent, buffered_sse, get_agent
+
+# Campus info is constant, so its response bodies are serialized once at import
+# (the constants are read-only mappings, which orjson encodes via dict)
+CAFETERIA_BYTES = orjson.dumps({"timings": CAFETERIA_TIMINGS}, default=dict)
+LIBRARY_BYTES = orjson.dumps({"hours": LIBRARY_HOURS}, default=dict)
+EVENTS_BYTES = orjson.dumps({"schedule": EVENT_SCHEDULE}, default=dict)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     api_logger.info("Starting up Campus AI Admin application")
+    await init_mongodb()
+    conversation_writer.start()
+    activity_writer.start()
     yield
     # Shutdown
     api_logger.info("Shutting down Campus AI Admin application")
+    await conversation_writer.stop()
+    await activity_writer.stop()
+    await close_mongodb()
 
 app = FastAPI(
     title="Campus AI Admin",
@@ -74,6 +92,7 @@ app = FastAPI(
             "description": "General campus information"
         }
     ],
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -86,30 +105,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Event streams must reach the client frame by frame, so they are never compressed
+UNCOMPRESSED_PATHS = frozenset({"/chat/stream"})
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """GZip middleware that passes event streams through untouched"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in UNCOMPRESSED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Compress larger JSON bodies such as student lists and analytics
+app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=1024, compresslevel=4)
+
+# Our middleware already logs each request; production can quiet uvicorn's copy
+logging.getLogger("uvicorn.access").setLevel(
+    os.getenv("UVICORN_ACCESS_LOG_LEVEL", "INFO").upper()
+)
+
 # Add logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
     response = await call_next(request)
     duration = time.time() - start_time
-    api_logger.info(
-        f"Method: {request.method} Path: {request.url.path} "
-        f"Status: {response.status_code} Duration: {duration:.2f}s"
-    )
+    if api_logger.isEnabledFor(logging.INFO):
+        api_logger.info(
+            "Method: %s Path: %s Status: %s Duration: %.2fs",
+            request.method, request.url.path, response.status_code, duration
+        )
     return response
 
 # Exception handlers
 @app.exception_handler(BaseAppException)
 async def app_exception_handler(request: Request, exc: BaseAppException):
     api_logger.error(
-        f"Application error: {exc.detail}",
+        "Application error: %s", exc.detail,
         extra={
             "error_code": exc.error_code,
             "path": request.url.path,
             "method": request.method
         }
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
@@ -126,7 +166,7 @@ async def general_exception_handler(request: Request, exc: Exception):
             "method": request.method
         }
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
@@ -135,8 +175,8 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 # Dependency to get campus tools
-def get_tools(db: AsyncIOMotorClient = Depends(get_db)) -> CampusTools:
-    return get_campus_tools(db)
+async def get_tools(db: AsyncIOMotorClient = Depends(get_db)) -> CampusTools:
+    return await get_campus_tools(db)
 
 # Include authentication routes
 from .auth.routes import router as auth_router
@@ -174,7 +214,7 @@ app.include_router(auth_router)
         }
     }
 )
-def create_student(
+async def create_student(
     student: StudentCreate,
     tools: CampusTools = Depends(get_tools),
     current_user = Depends(check_role(UserRole.STAFF))
@@ -187,7 +227,26 @@ def create_student(
     - **department**: Department name
     - **email**: Valid email address
     """
-    return tools.add_student(student)
+    return await tools.add_student(student)
+
+@app.post(
+    "/students/bulk",
+    response_model=BulkStudentResponse,
+    tags=["students"],
+    summary="Create many students",
+    description="Create a batch of students in one request. Requires STAFF or ADMIN role."
+)
+async def bulk_create_students(
+    students: List[StudentCreate],
+    tools: CampusTools = Depends(get_tools),
+    current_user = Depends(check_role(UserRole.STAFF))
+):
+    """
+    Create several students at once. Students whose ID or email already
+    exists, or that could not be written, are skipped and reported back in
+    `failed`.
+    """
+    return await tools.bulk_create_students(students)
 
 @app.get(
     "/students/{student_id}",
@@ -219,7 +278,7 @@ def create_student(
         }
     }
 )
-def get_student(
+async def get_student(
     student_id: str,
     tools: CampusTools = Depends(get_tools),
     current_user = Depends(get_current_active_user)
@@ -229,7 +288,7 @@ def get_student(
     
     - **student_id**: The unique identifier of the student
     """
-    student = tools.get_student(student_id)
+    student = await tools.get_student(student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     return student
@@ -239,7 +298,7 @@ def get_student(
     response_model=List[StudentResponse],
     tags=["students"],
     summary="List all students",
-    description="Retrieve a list of all students in the system.",
+    description="Retrieve students as a JSON array, or stream them as NDJSON with `?format=ndjson` or `Accept: application/x-ndjson`.",
     responses={
         200: {
             "description": "List of students retrieved successfully",
@@ -259,6 +318,13 @@ def get_student(
                             "email": "jane@example.com"
                         }
                     ]
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string"},
+                    "example": (
+                        '{"id":"ST001","name":"John Doe","department":"Computer Science","email":"john@example.com"}\n'
+                        '{"id":"ST002","name":"Jane Smith","department":"Physics","email":"jane@example.com"}\n'
+                    )
                 }
             }
         },
@@ -267,134 +333,119 @@ def get_student(
         }
     }
 )
-def list_students(
+async def list_students(
+    response_format: Optional[str] = Query(None, alias="format", pattern="^(ndjson|json)$"),
+    accept: Optional[str] = Header(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=500),
+    before: Optional[datetime] = None,
     tools: CampusTools = Depends(get_tools),
     current_user = Depends(get_current_active_user)
 ):
     """
-    Retrieve a list of all students. Authentication required but no specific role needed.
-    Returns an array of student objects containing basic information.
+    Retrieve all students. Authentication required but no specific role needed.
+    Returns a JSON array by default; pass `?format=ndjson` or send
+    `Accept: application/x-ndjson` to stream one JSON object per line instead.
+    
+    The array form is paged newest first with `skip`/`limit`, or with `before`
+    set to the last `created_at` seen for cheap deep paging.
     """
-    return tools.list_students()
+    if response_format is None:
+        response_format = "ndjson" if accept and "application/x-ndjson" in accept else "json"
+    
+    if response_format == "json":
+        return StreamingResponse(
+            tools.stream_students_array(skip=skip, limit=limit, before=before),
+            media_type="application/json"
+        )
+    return StreamingResponse(
+        tools.stream_students(),
+        media_type="application/x-ndjson"
+    )
 
 @app.put("/students/{student_id}", response_model=StudentResponse)
-def update_student(
+async def update_student(
     student_id: str, 
     student_update: StudentUpdate, 
     tools: CampusTools = Depends(get_tools),
     current_user = Depends(check_role(UserRole.STAFF))
 ):
-    student = tools.update_student(student_id, student_update)
+    student = await tools.update_student(student_id, student_update)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     return student
 
 @app.delete("/students/{student_id}")
-def delete_student(
+async def delete_student(
     student_id: str,
     tools: CampusTools = Depends(get_tools),
     current_user = Depends(check_role(UserRole.ADMIN))
 ):
-    success = tools.delete_student(student_id)
+    success = await tools.delete_student(student_id)
     if not success:
         raise HTTPException(status_code=404, detail="Student not found")
     return {"message": "Student deleted successfully"}
 
 # Analytics Endpoints
 @app.get("/analytics/", response_model=AnalyticsResponse)
-def get_analytics(tools: CampusTools = Depends(get_tools)):
-    return {
-        "total_students": tools.get_total_students(),
-        "students_by_department": tools.get_students_by_department(),
-        "recent_students": tools.get_recent_onboarded_students(),
-        "active_students_last_7_days": tools.get_active_students_last_7_days()
-    }
+async def get_analytics(tools: CampusTools = Depends(get_tools)):
+    return await tools.get_analytics_bundle()
 
 # Campus Information Endpoints
 @app.get("/campus/cafeteria")
-def get_cafeteria_info(tools: CampusTools = Depends(get_tools)):
-    return {"timings": tools.get_cafeteria_timings()}
+async def get_cafeteria_info():
+    return Response(content=CAFETERIA_BYTES, media_type="application/json")
 
 @app.get("/campus/library")
-def get_library_info(tools: CampusTools = Depends(get_tools)):
-    return {"hours": tools.get_library_hours()}
+async def get_library_info():
+    return Response(content=LIBRARY_BYTES, media_type="application/json")
 
 @app.get("/campus/events")
-def get_events(tools: CampusTools = Depends(get_tools)):
-    return {"schedule": tools.get_event_schedule()}
+async def get_events():
+    return Response(content=EVENTS_BYTES, media_type="application/json")
 
 # Chat Endpoints
+async def get_chat_agent(db: AsyncIOMotorClient = Depends(get_db)) -> CampusAgent:
+    return get_agent(db)
+
 @app.post("/chat/", response_model=ChatResponse, tags=["chat"])
 async def chat(
     message: ChatMessage,
-    agent: ChatAgent = Depends(ChatAgent),
-    db = Depends(get_db)
+    agent: CampusAgent = Depends(get_chat_agent)
 ):
     """
     Regular chat endpoint for synchronous responses.
     Returns a complete response in a single API call.
     """
-    response = await agent.get_response(message.message, message.session_id)
+    response = await agent.chat(message.message, message.session_id)
     return response
 
 @app.get("/chat/stream", tags=["chat"])
 async def stream_chat(
-    request: Request,
-    message: str,
+    message: str = Query(..., max_length=MAX_CHAT_MESSAGE_LENGTH),
     session_id: Optional[str] = None,
-    agent: ChatAgent = Depends(ChatAgent),
-    db = Depends(get_db)
+    agent: CampusAgent = Depends(get_chat_agent)
 ):
     """
     Streaming chat endpoint using Server-Sent Events (SSE).
     Yields response tokens in real-time as they are generated.
     """
-    async def event_generator():
-        try:
-            async for response in agent.stream_response(message, session_id):
-                if await request.is_disconnected():
-                    break
-                    
-                # Format the SSE data
-                if isinstance(response, dict):
-                    # Final message with session info
-                    yield {
-                        "event": "done",
-                        "data": json.dumps(response)
-                    }
-                else:
-                    # Streaming token
-                    yield {
-                        "event": "message",
-                        "data": json.dumps({"content": response})
-                    }
-                    
-                # Add a retry interval
-                yield {
-                    "retry": 15000  # 15 seconds
-                }
-                
-        except Exception as e:
-            # Send error event
-            yield {
-                "event": "error",
-                "data": json.dumps({"error": str(e)})
-            }
-    
-    return EventSourceResponse(
-        event_generator(),
+    # The agent yields ready-encoded SSE frames; they are coalesced into larger writes
+    return StreamingResponse(
+        buffered_sse(agent.chat_stream(message, session_id)),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
+            "Content-Encoding": "identity",
             "X-Accel-Buffering": "no"  # Disable buffering in nginx
         }
     )
 
 # Email Endpoints
 @app.post("/email/", response_model=EmailResponse)
-def send_email(email_request: EmailRequest, tools: CampusTools = Depends(get_tools)):
-    success = tools.send_email(email_request.student_id, email_request.message)
+async def send_email(email_request: EmailRequest, tools: CampusTools = Depends(get_tools)):
+    success = await tools.send_email(email_request.student_id, email_request.message)
     return {
         "success": success,
         "message": "Email sent successfully" if success else "Failed to send email"
@@ -402,6 +453,7 @@ def send_email(email_request: EmailRequest, tools: CampusTools = Depends(get_too
 
 # Activity Logging
 @app.post("/activity/", response_model=None)
-def log_activity(activity: ActivityLogCreate, tools: CampusTools = Depends(get_tools)):
-    tools.log_activity(activity)
+async def log_activity(activity: ActivityLogCreate, tools: CampusTools = Depends(get_tools)):
+    student = await tools.get_student(activity.student_id)
+    tools.log_activity(student, activity.activity_type, activity.description)
     return {"message": "Activity logged successfully"}
\ No newline at end of file
@@ -1,9 +1,21 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
 from beanie import Document, Link
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from enum import Enum
 
+def utc_now() -> datetime:
+    """Get the current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
+# Shared by response models: they only carry data the app produced itself
+RESPONSE_MODEL_CONFIG = ConfigDict(
+    extra="ignore",
+    from_attributes=True,
+    populate_by_name=True
+)
+
 class UserRole(str, Enum):
     ADMIN = "admin"
     STAFF = "staff"
@@ -14,13 +26,13 @@ class User(Document):
     hashed_password: str
     role: UserRole
     is_active: bool = True
-    created_at: datetime = datetime.utcnow()
-    updated_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
     class Settings:
         name = "users"
         indexes = [
-            "email",
+            IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
             "role"
         ]
 
@@ -29,19 +41,23 @@ class Student(Document):
     name: str
     department: str
     email: EmailStr
-    created_at: datetime = datetime.utcnow()
-    updated_at: datetime = datetime.utcnow()
+    created_at: datetime = Field(default_factory=utc_now)
+    updated_at: datetime = Field(default_factory=utc_now)
 
     class Settings:
         name = "students"
         indexes = [
-            "student_id",
-            "department",
-            "email"
+            IndexModel([("student_id", ASCENDING)], unique=True, name="student_id_unique"),
+            IndexModel([("department", ASCENDING)]),
+            IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+            IndexModel([("created_at", DESCENDING)])
         ]
 
 class StudentCreate(BaseModel):
     student_id: str
+    name: str
+    department: str
+    email: EmailStr
 
 class StudentUpdate(BaseModel):
     name: Optional[str] = None
@@ -49,6 +65,8 @@ class StudentUpdate(BaseModel):
     email: Optional[EmailStr] = None
 
 class StudentResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     student_id: str
     name: str
     department: str
@@ -56,15 +74,28 @@ class StudentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class BulkStudentResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
+    inserted: int
+    failed: List[str]
+
+# Longest chat message accepted; longer input is rejected before any processing
+MAX_CHAT_MESSAGE_LENGTH = 10_000
+
 class ChatMessage(BaseModel):
-    message: str
+    message: str = Field(..., max_length=MAX_CHAT_MESSAGE_LENGTH)
     session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     response: str
     session_id: str
 
 class AnalyticsResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     total_students: int
     students_by_department: Dict[str, int]
     recent_students: List[StudentResponse]
@@ -74,14 +105,15 @@ class ActivityLog(Document):
     student: Link[Student]
     activity_type: str
     description: str
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=utc_now)
 
     class Settings:
         name = "activity_logs"
         indexes = [
             "student",
             "activity_type",
-            "timestamp"
+            # Range on timestamp then the group key, so the 7-day count is index-only
+            IndexModel([("timestamp", DESCENDING), ("student", ASCENDING)])
         ]
 
 class ActivityLogCreate(BaseModel):
@@ -90,6 +122,8 @@ class ActivityLogCreate(BaseModel):
     description: str
 
 class ActivityLogResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     student_id: str
     activity_type: str
     description: str
@@ -99,23 +133,32 @@ class Conversation(Document):
     session_id: str
     message: str
     response: str
-    timestamp: datetime = datetime.utcnow()
+    timestamp: datetime = Field(default_factory=utc_now)
 
     class Settings:
         name = "conversations"
         indexes = [
-            "session_id",
+            # Serves history lookups for a session in timestamp order
+            IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING)]),
             "timestamp"
         ]
     
     class Config:
         from_attributes = True
 
+class ConversationTurn(BaseModel):
+    """Projection of a Conversation with just the fields chat history needs"""
+    message: str
+    response: str
+    timestamp: datetime
+
 class EmailRequest(BaseModel):
     student_id: str
     message: str
 
 class EmailResponse(BaseModel):
+    model_config = RESPONSE_MODEL_CONFIG
+
     success: bool
     message: str
 
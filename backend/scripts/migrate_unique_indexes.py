@@ -0,0 +1,80 @@
+"""Prepare an existing database for the unique email/student_id indexes.
+
+Older deployments have plain non-unique indexes on these fields (email_1,
+student_id_1). MongoDB refuses to build a unique index over the same key while
+they exist, or while duplicate values are stored, so run this once before
+starting the new version:
+
+    python -m backend.scripts.migrate_unique_indexes [--delete-duplicates]
+
+Without --delete-duplicates it only reports duplicates and exits non-zero.
+With it, the oldest document for each value is kept and the rest are deleted.
+"""
+from backend.db import DATABASE_NAME, MONGODB_URL
+from motor.motor_asyncio import AsyncIOMotorClient
+import argparse
+import asyncio
+import sys
+
+# Collection -> fields that now carry a unique index
+UNIQUE_FIELDS = {
+    "users": ["email"],
+    "students": ["student_id", "email"]
+}
+
+async def find_duplicates(collection, field: str) -> list:
+    """Group documents sharing a value, oldest _id first"""
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    return await collection.aggregate(pipeline).to_list(length=None)
+
+async def drop_plain_index(collection, field: str):
+    """Drop non-unique single-field indexes on the field"""
+    for name, info in (await collection.index_information()).items():
+        if info["key"] == [(field, 1)] and not info.get("unique"):
+            await collection.drop_index(name)
+            print(f"Dropped index {collection.name}.{name}")
+
+async def migrate_unique_indexes(delete_duplicates: bool) -> bool:
+    # A raw client: init_mongodb would try to build the unique indexes first
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+
+    clean = True
+    try:
+        for collection_name, fields in UNIQUE_FIELDS.items():
+            collection = db[collection_name]
+            for field in fields:
+                field_clean = True
+                for group in await find_duplicates(collection, field):
+                    extra_ids = group["ids"][1:]
+                    if delete_duplicates:
+                        await collection.delete_many({"_id": {"$in": extra_ids}})
+                        print(f"Deleted {len(extra_ids)} duplicate {collection_name} with {field}={group['_id']!r}")
+                    else:
+                        field_clean = clean = False
+                        print(f"Duplicate {collection_name} {field}={group['_id']!r}: {group['count']} documents {group['ids']}")
+
+                if field_clean:
+                    await drop_plain_index(collection, field)
+    finally:
+        client.close()
+
+    if clean:
+        print("Database is ready for the unique indexes")
+    else:
+        print("Resolve the duplicates above or rerun with --delete-duplicates")
+    return clean
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare the database for unique email/student_id indexes")
+    parser.add_argument(
+        "--delete-duplicates",
+        action="store_true",
+        help="keep the oldest document for each duplicated value and delete the rest"
+    )
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(migrate_unique_indexes(args.delete_duplicates)) else 1)
@@ -1,7 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 import os
 from typing import Generator
 
@@ -11,12 +12,25 @@ from backend.auth.security import get_password_hash
 from backend.auth.models import UserRole
 from backend.db import User
 
-# Test database
-SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test.db"
+# Test database: in memory, shared by every connection for the whole session
+SQLALCHEMY_TEST_DATABASE_URL = "sqlite+pysqlite:///file::memory:?cache=shared&uri=true"
 
 engine = create_engine(
-    SQLALCHEMY_TEST_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
 )
+
+# pysqlite defers BEGIN until the first write, which turns per-test savepoints
+# into real commits; let SQLAlchemy emit BEGIN itself so rollbacks isolate tests
+@event.listens_for(engine, "connect")
+def disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(engine, "begin")
+def begin_sqlite_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def override_get_db():
@@ -34,14 +48,14 @@ def test_db():
     yield
     Base.metadata.drop_all(bind=engine)
 
-@pytest.fixture(scope="function")
-def client(test_db) -> Generator:
-    with TestClient(app) as c:
-        yield c
+@pytest.fixture(scope="session")
+def connection(test_db):
+    with engine.connect() as conn:
+        yield conn
 
-@pytest.fixture(scope="function")
-def test_user(test_db):
-    db = TestingSessionLocal()
+@pytest.fixture(scope="session")
+def test_user(connection):
+    db = TestingSessionLocal(bind=connection)
     user = User(
         email="test@example.com",
         hashed_password=get_password_hash("testpassword"),
@@ -51,7 +65,34 @@ def test_user(test_db):
     db.add(user)
     db.commit()
     db.refresh(user)
+    # refresh() began a new transaction on the shared connection; close the session
+    # so it ends before the per-test transactions start (the user stays loaded)
+    db.close()
     yield user
-    db.delete(user)
-    db.commit()
-    db.close()
\ No newline at end of file
+
+@pytest.fixture(autouse=True)
+def rollback_after_test(connection):
+    """Run each test inside a transaction whose commits become savepoints"""
+    transaction = connection.begin()
+    TestingSessionLocal.configure(bind=connection, join_transaction_mode="create_savepoint")
+    yield
+    transaction.rollback()
+    TestingSessionLocal.configure(bind=engine)
+
+@pytest.fixture(scope="session")
+def client(test_db) -> Generator:
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def auth_headers(client, test_user) -> dict:
+    """Log in once per session; password verification is deliberately slow"""
+    response = client.post(
+        "/auth/token",
+        data={
+            "username": "test@example.com",
+            "password": "testpassword"
+        }
+    )
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,114 @@
+import asyncio
+import inspect
+from unittest.mock import AsyncMock
+
+import pytest
+
+from backend import agent as agent_module
+from backend.models import StudentCreate
+from backend.tools_new import CampusTools
+
+# Sample values for the arguments the model may send, by JSON schema type
+SAMPLE_ARGUMENTS = {
+    "string": "ST001",
+    "integer": 5
+}
+
+def sample_arguments(schema: dict) -> dict:
+    arguments = {}
+    for name, spec in schema["parameters"]["properties"].items():
+        arguments[name] = "jane@example.com" if name == "email" else SAMPLE_ARGUMENTS[spec["type"]]
+    return arguments
+
+def checked_async_mock(method) -> AsyncMock:
+    """AsyncMock that raises TypeError for calls the real method would reject"""
+    signature = inspect.signature(method)
+    
+    def check(*args, **kwargs):
+        signature.bind(*args, **kwargs)
+    
+    return AsyncMock(spec=method, side_effect=check)
+
+@pytest.fixture
+def agent(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    # Database tools are mocked with their real signatures, so a schema/argument
+    # mismatch surfaces as an error result; the constant getters run as-is
+    tools = CampusTools(None)
+    for name in agent_module.FUNCTION_NAMES:
+        method = getattr(tools, name)
+        if inspect.iscoroutinefunction(method):
+            setattr(tools, name, checked_async_mock(method))
+    monkeypatch.setattr(agent_module, "CampusTools", lambda db: tools)
+    return agent_module.CampusAgent(None)
+
+@pytest.mark.parametrize(
+    "schema", agent_module.FUNCTION_SCHEMAS, ids=lambda schema: schema["name"]
+)
+def test_function_schema_matches_tool(agent, schema):
+    result = asyncio.run(agent._execute_function(schema["name"], sample_arguments(schema)))
+    assert not (isinstance(result, dict) and result.get("success") is False), result
+
+def test_student_fields_become_request_models(agent):
+    asyncio.run(agent._execute_function("add_student", {
+        "student_id": "ST001",
+        "name": "John Doe",
+        "department": "Physics",
+        "email": "john@example.com"
+    }))
+    asyncio.run(agent._execute_function("update_student", {
+        "student_id": "ST001",
+        "department": "Chemistry"
+    }))
+    
+    (student_data,), _ = agent.tools.add_student.call_args
+    assert student_data == StudentCreate(
+        student_id="ST001", name="John Doe", department="Physics", email="john@example.com"
+    )
+    (student_id, update_data), _ = agent.tools.update_student.call_args
+    assert student_id == "ST001"
+    assert update_data.model_dump(exclude_unset=True) == {"department": "Chemistry"}
+
+@pytest.mark.parametrize("message, function_name", [
+    ("library hours", "get_library_hours"),
+    ("What are the library hours?", "get_library_hours"),
+    ("When does the canteen close today?", "get_cafeteria_timings"),
+    ("cafeteria timings please", "get_cafeteria_timings"),
+    ("What are the upcoming campus events?", "get_event_schedule")
+])
+def test_info_question_is_routed(agent, message, function_name):
+    assert agent._intent_route(message)[0] == function_name
+
+@pytest.mark.parametrize("message", [
+    "Send an email to ST001 saying the library hours have changed",
+    "Tell ST001 the cafeteria timings",
+    "Update the library hours",
+    "What are the library hours and how many students are in Physics?",
+    "Compare the cafeteria hours with the library hours",
+    "Why is the library closed on weekends?",
+    "How many students used the library this week?"
+])
+def test_other_messages_go_to_model(agent, message):
+    assert agent._intent_route(message) is None
+
+def test_waiter_completes_when_owner_is_cancelled(agent, monkeypatch):
+    calls = []
+    
+    async def complete(cache_key, model, messages):
+        calls.append(cache_key)
+        if len(calls) == 1:
+            await asyncio.Event().wait()
+        return "reply"
+    
+    monkeypatch.setattr(agent, "_complete", complete)
+    
+    async def run():
+        owner = asyncio.create_task(agent._complete_once("key", "model", []))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(agent._complete_once("key", "model", []))
+        await asyncio.sleep(0)
+        owner.cancel()
+        return await waiter
+    
+    assert asyncio.run(run()) == "reply"
+    assert len(calls) == 2
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+from pymongo.errors import BulkWriteError
+
+from backend.db import DUPLICATE_KEY_ERROR, DocumentWriter
+
+class FakeModel:
+    """Stands in for a Beanie document class; records what insert_many saved"""
+    
+    __name__ = "FakeModel"
+    
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.saved = []
+    
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(0)
+        if self.failures:
+            failure = self.failures.pop(0)
+            raise failure(documents) if callable(failure) else failure
+        self.saved.extend(documents)
+
+def make_documents(count):
+    return [SimpleNamespace(id=None, n=n) for n in range(count)]
+
+def test_stop_saves_queued_and_in_flight_documents():
+    model = FakeModel()
+    documents = make_documents(120)
+    
+    async def run():
+        writer = DocumentWriter(model, batch_size=50, flush_interval=10)
+        for document in documents:
+            writer.put(document)
+        await asyncio.sleep(0)
+        await writer.stop()
+    
+    asyncio.run(run())
+    assert sorted(document.n for document in model.saved) == list(range(120))
+
+def test_failed_batch_is_retried():
+    model = FakeModel(ConnectionError("down"))
+    documents = make_documents(3)
+    
+    async def run():
+        writer = DocumentWriter(model, retry_delay=0)
+        for document in documents:
+            writer.put(document)
+        await writer.stop()
+    
+    asyncio.run(run())
+    assert model.saved == documents
+
+def test_retry_skips_documents_already_saved():
+    def partial_write(documents):
+        return BulkWriteError({"writeErrors": [
+            {"index": 0, "code": DUPLICATE_KEY_ERROR},
+            {"index": 2, "code": 91}
+        ]})
+    
+    model = FakeModel(partial_write)
+    documents = make_documents(3)
+    
+    async def run():
+        writer = DocumentWriter(model, retry_delay=0)
+        for document in documents:
+            writer.put(document)
+        await writer.stop()
+    
+    asyncio.run(run())
+    assert model.saved == [documents[2]]
+    assert all(document.id is not None for document in documents)
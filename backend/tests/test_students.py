@@ -1,104 +1,112 @@
+import orjson
 import pytest
 from fastapi.testclient import TestClient
 from backend.models import StudentCreate, StudentUpdate
 
-def get_auth_headers(client: TestClient, test_user) -> dict:
-    response = client.post(
-        "/auth/token",
-        data={
-            "username": "test@example.com",
-            "password": "testpassword"
-        }
-    )
-    token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
+# Students the read/update/delete tests work on, created with one bulk request
+SEED_STUDENTS = [
+    {
+        "student_id": "ST002",
+        "name": "Jane Doe",
+        "department": "Physics",
+        "email": "jane@example.com"
+    },
+    {
+        "student_id": "ST003",
+        "name": "Alice Smith",
+        "department": "Mathematics",
+        "email": "alice@example.com"
+    },
+    {
+        "student_id": "ST004",
+        "name": "Bob Wilson",
+        "department": "Chemistry",
+        "email": "bob@example.com"
+    }
+]
+
+@pytest.fixture(scope="module")
+def seeded_students(client: TestClient, auth_headers) -> dict:
+    response = client.post("/students/bulk", headers=auth_headers, json=SEED_STUDENTS)
+    assert response.status_code == 200
+    assert response.json()["inserted"] == len(SEED_STUDENTS)
+    return {student["student_id"]: student for student in SEED_STUDENTS}
 
-def test_create_student(client: TestClient, test_user):
-    headers = get_auth_headers(client, test_user)
+def test_create_student(client: TestClient, auth_headers):
     student_data = {
-        "id": "ST001",
+        "student_id": "ST001",
         "name": "John Doe",
         "department": "Computer Science",
         "email": "john@example.com"
     }
-    response = client.post("/students/", headers=headers, json=student_data)
+    response = client.post("/students/", headers=auth_headers, json=student_data)
     assert response.status_code == 200
     assert response.json()["name"] == student_data["name"]
     assert response.json()["department"] == student_data["department"]
     assert response.json()["email"] == student_data["email"]
 
-def test_get_student(client: TestClient, test_user):
-    # First create a student
-    headers = get_auth_headers(client, test_user)
-    student_data = {
-        "id": "ST002",
-        "name": "Jane Doe",
-        "department": "Physics",
-        "email": "jane@example.com"
-    }
-    client.post("/students/", headers=headers, json=student_data)
+def test_get_student(client: TestClient, auth_headers, seeded_students):
+    student_data = seeded_students["ST002"]
     
-    # Now retrieve the student
-    response = client.get(f"/students/{student_data['id']}", headers=headers)
+    response = client.get(f"/students/{student_data['student_id']}", headers=auth_headers)
     assert response.status_code == 200
     assert response.json()["name"] == student_data["name"]
     assert response.json()["department"] == student_data["department"]
 
-def test_list_students(client: TestClient, test_user):
-    headers = get_auth_headers(client, test_user)
-    response = client.get("/students/", headers=headers)
+def test_list_students(client: TestClient, auth_headers):
+    response = client.get("/students/", headers=auth_headers)
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
-def test_update_student(client: TestClient, test_user):
-    # First create a student
-    headers = get_auth_headers(client, test_user)
-    student_data = {
-        "id": "ST003",
-        "name": "Alice Smith",
-        "department": "Mathematics",
-        "email": "alice@example.com"
-    }
-    client.post("/students/", headers=headers, json=student_data)
+def test_list_students_ndjson(client: TestClient, auth_headers, seeded_students):
+    response = client.get(
+        "/students/",
+        headers={**auth_headers, "Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [line for line in response.text.splitlines() if line]
+    assert {orjson.loads(line)["student_id"] for line in lines} >= set(seeded_students)
+
+def test_update_student(client: TestClient, auth_headers, seeded_students):
+    student_data = seeded_students["ST003"]
     
     # Update the student
     update_data = {
         "department": "Applied Mathematics"
     }
     response = client.put(
-        f"/students/{student_data['id']}",
-        headers=headers,
+        f"/students/{student_data['student_id']}",
+        headers=auth_headers,
         json=update_data
     )
     assert response.status_code == 200
     assert response.json()["department"] == update_data["department"]
     assert response.json()["name"] == student_data["name"]
 
-def test_delete_student(client: TestClient, test_user):
-    # First create a student
-    headers = get_auth_headers(client, test_user)
-    student_data = {
-        "id": "ST004",
-        "name": "Bob Wilson",
-        "department": "Chemistry",
-        "email": "bob@example.com"
-    }
-    client.post("/students/", headers=headers, json=student_data)
+def test_update_missing_student(client: TestClient, auth_headers):
+    # An empty update reads the student back, and must 404 like a real update
+    for update_data in ({}, {"department": "Physics"}):
+        response = client.put("/students/NOPE", headers=auth_headers, json=update_data)
+        assert response.status_code == 404
+
+def test_delete_student(client: TestClient, auth_headers, seeded_students):
+    student_data = seeded_students["ST004"]
     
     # Delete the student
     response = client.delete(
-        f"/students/{student_data['id']}",
-        headers=headers
+        f"/students/{student_data['student_id']}",
+        headers=auth_headers
     )
     assert response.status_code == 200
     
     # Verify deletion
     response = client.get(
-        f"/students/{student_data['id']}",
-        headers=headers
+        f"/students/{student_data['student_id']}",
+        headers=auth_headers
     )
     assert response.status_code == 404
 
 def test_unauthorized_access(client: TestClient):
     response = client.get("/students/")
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
@@ -1,18 +1,68 @@
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from types import MappingProxyType
+from typing import AsyncIterator, List, Dict, Mapping, Optional, Sequence, Union
+import asyncio
 import logging
+import os
+import orjson
+from beanie import PydanticObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from .models import (
     Student, ActivityLog, User,
     StudentCreate, StudentUpdate, StudentResponse,
-    ActivityLogCreate, ActivityLogResponse
+    ActivityLogCreate, ActivityLogResponse, utc_now
 )
+from .cache import TTLCache
+from .db import DUPLICATE_KEY_ERROR, activity_writer
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Assembled analytics are cached briefly; 0 disables the cache
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "30"))
+_analytics_cache = TTLCache(maxsize=8, ttl=ANALYTICS_CACHE_TTL)
+# Bumped on every student mutation so this process never serves stale analytics;
+# other workers keep their own cache and catch up within ANALYTICS_CACHE_TTL
+_analytics_version = 0
+
+# Raw-cursor projection matching StudentResponse, used when streaming lists
+STUDENT_RESPONSE_PROJECTION = {
+    "_id": 0, **{field: 1 for field in StudentResponse.model_fields}
+}
+STREAM_BATCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+
+# Static campus information, read-only since it is shared by every request
+CAFETERIA_TIMINGS = MappingProxyType({
+    "weekdays": "7:30 AM - 8:00 PM",
+    "weekends": "8:00 AM - 6:00 PM"
+})
+LIBRARY_HOURS = MappingProxyType({
+    "weekdays": "8:00 AM - 10:00 PM",
+    "weekends": "9:00 AM - 6:00 PM"
+})
+EVENT_SCHEDULE = (
+    MappingProxyType({
+        "name": "Tech Symposium 2025",
+        "date": "2025-10-15",
+        "location": "Main Auditorium"
+    }),
+    MappingProxyType({
+        "name": "Career Fair",
+        "date": "2025-10-20",
+        "location": "Student Center"
+    })
+)
+
+def invalidate_analytics():
+    """Invalidate cached analytics after a student mutation"""
+    global _analytics_version
+    _analytics_version += 1
+
 class CampusTools:
     def __init__(self, client: AsyncIOMotorClient):
         self.client = client
@@ -20,42 +70,81 @@ class CampusTools:
     async def add_student(self, student_data: StudentCreate) -> Student:
         """Add a new student to the database"""
         try:
-            # Check if student already exists
-            existing_student = await Student.find_one({
-                "student_id": student_data.student_id
-            })
-            if existing_student:
-                raise ValueError(f"Student with ID {student_data.student_id} already exists")
-            
-            # Check if email already exists
-            existing_email = await Student.find_one({
-                "email": student_data.email
-            })
-            if existing_email:
-                raise ValueError(f"Student with email {student_data.email} already exists")
-            
-            # Create new student
+            now = utc_now()
+            # Create new student; the unique indexes reject duplicates in the same round-trip
             student = Student(
                 student_id=student_data.student_id,
                 name=student_data.name,
                 department=student_data.department,
-                email=student_data.email
+                email=student_data.email,
+                created_at=now,
+                updated_at=now
             )
-            await student.insert()
+            try:
+                await student.insert()
+            except DuplicateKeyError as e:
+                if "email" in (e.details or {}).get("keyPattern", {}):
+                    raise ValueError(f"Student with email {student_data.email} already exists")
+                raise ValueError(f"Student with ID {student_data.student_id} already exists")
+            invalidate_analytics()
             
             # Log activity
-            await self.log_activity(
-                student_data.student_id,
+            self.log_activity(
+                student,
                 "student_added",
-                f"Student {student_data.name} added to {student_data.department} department"
+                f"Student {student_data.name} added to {student_data.department} department",
+                timestamp=now
             )
             
             return student
             
         except Exception as e:
-            logger.error(f"Error adding student: {str(e)}")
+            logger.error("Error adding student: %s", e)
             raise
     
+    async def bulk_create_students(self, students_data: List[StudentCreate]) -> Dict:
+        """Add many students in one round-trip, skipping ones that already exist"""
+        now = utc_now()
+        # Ids are assigned up front so the activity log can link to the inserted rows
+        students = [
+            Student(id=PydanticObjectId(), created_at=now, updated_at=now, **data.model_dump())
+            for data in students_data
+        ]
+        failed_indexes = set()
+        try:
+            await Student.insert_many(students, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details["writeErrors"]
+            failed_indexes = {error["index"] for error in write_errors}
+            duplicates = sum(error["code"] == DUPLICATE_KEY_ERROR for error in write_errors)
+            if duplicates:
+                logger.warning("Bulk student insert skipped %s duplicates", duplicates)
+            for error in write_errors:
+                if error["code"] != DUPLICATE_KEY_ERROR:
+                    logger.error(
+                        "Bulk student insert failed for %s: %s",
+                        students[error["index"]].student_id, error.get("errmsg")
+                    )
+        
+        inserted = [
+            student for index, student in enumerate(students)
+            if index not in failed_indexes
+        ]
+        if inserted:
+            invalidate_analytics()
+            for student in inserted:
+                self.log_activity(
+                    student,
+                    "student_added",
+                    f"Student {student.name} added to {student.department} department",
+                    timestamp=now
+                )
+        
+        return {
+            "inserted": len(inserted),
+            "failed": [students[index].student_id for index in sorted(failed_indexes)]
+        }
+    
     async def get_student(self, student_id: str) -> Optional[Student]:
         """Get student by ID"""
         try:
@@ -64,161 +153,252 @@ class CampusTools:
                 raise ValueError(f"Student with ID {student_id} not found")
             return student
         except Exception as e:
-            logger.error(f"Error getting student: {str(e)}")
+            logger.error("Error getting student: %s", e)
             raise
     
-    async def list_students(self) -> List[Student]:
-        """List all students"""
+    async def list_students(
+        self,
+        skip: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+        before: Optional[datetime] = None
+    ) -> List[StudentResponse]:
+        """List students newest first, paged by offset or by a created_at cursor"""
         try:
-            return await Student.find_all().to_list()
+            # A created_at cursor avoids the server walking past skipped rows on deep pages
+            query = Student.find(Student.created_at < before) if before else Student.find_all()
+            return await query.sort(-Student.created_at).skip(skip).limit(limit).project(
+                StudentResponse
+            ).to_list()
         except Exception as e:
-            logger.error(f"Error listing students: {str(e)}")
+            logger.error("Error listing students: %s", e)
             raise
     
-    async def update_student(self, student_id: str, update_data: StudentUpdate) -> Optional[Student]:
+    async def iter_students(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        before: Optional[datetime] = None,
+        batch_size: int = STREAM_BATCH_SIZE
+    ) -> AsyncIterator[Dict]:
+        """Iterate students newest first as raw documents shaped like StudentResponse"""
+        query = {"created_at": {"$lt": before}} if before else {}
+        cursor = Student.get_pymongo_collection().find(
+            query, STUDENT_RESPONSE_PROJECTION
+        ).sort("created_at", -1).skip(skip).limit(limit).batch_size(batch_size)
+        try:
+            async for doc in cursor:
+                yield doc
+        except Exception as e:
+            logger.error("Error streaming students: %s", e)
+            raise
+        finally:
+            await cursor.close()
+    
+    async def stream_students(self) -> AsyncIterator[bytes]:
+        """Stream all students as NDJSON lines straight from the cursor"""
+        async for doc in self.iter_students():
+            yield orjson.dumps(doc) + b"\n"
+    
+    async def stream_students_array(
+        self,
+        skip: int = 0,
+        limit: int = DEFAULT_PAGE_SIZE,
+        before: Optional[datetime] = None
+    ) -> AsyncIterator[bytes]:
+        """Stream a page of students as a JSON array, one element per chunk"""
+        separator = b"["
+        async for doc in self.iter_students(skip=skip, limit=limit, before=before):
+            yield separator + orjson.dumps(doc)
+            separator = b","
+        yield b"]" if separator == b"," else b"[]"
+    
+    async def update_student(
+        self, student_id: str, update_data: StudentUpdate
+    ) -> Optional[Union[Student, StudentResponse]]:
         """Update student information"""
         try:
-            student = await self.get_student(student_id)
-            if not student:
-                raise ValueError(f"Student with ID {student_id} not found")
-            
             update_dict = update_data.dict(exclude_unset=True)
+            # A PUT that changes nothing only needs to read the student back;
+            # a missing student gives None, as on the write path
+            if not update_dict:
+                return await Student.find_one(
+                    {"student_id": student_id}, projection_model=StudentResponse
+                )
             
-            # Check if email is being updated and if it already exists
-            if "email" in update_dict:
-                existing_email = await Student.find_one({
-                    "email": update_dict["email"],
-                    "student_id": {"$ne": student_id}
-                })
-                if existing_email:
-                    raise ValueError(f"Email {update_dict['email']} is already in use")
-            
-            if update_dict:
-                update_dict["updated_at"] = datetime.utcnow()
-                await student.set({**update_dict})
-                
-                # Log activity
-                await self.log_activity(
-                    student_id,
-                    "student_updated",
-                    f"Student information updated: {', '.join(update_dict.keys())}"
+            now = utc_now()
+            update_dict["updated_at"] = now
+            # Write only the changed fields and get the result back in one round-trip;
+            # the unique email index rejects an address already in use
+            try:
+                updated = await Student.get_pymongo_collection().find_one_and_update(
+                    {"student_id": student_id},
+                    {"$set": update_dict},
+                    return_document=ReturnDocument.AFTER
                 )
+            except DuplicateKeyError:
+                raise ValueError(f"Email {update_dict['email']} is already in use")
+            if updated is None:
+                return None
+            student = Student.model_validate(updated)
+            invalidate_analytics()
+            
+            # Log activity
+            self.log_activity(
+                student,
+                "student_updated",
+                f"Student information updated: {', '.join(update_dict.keys())}",
+                timestamp=now
+            )
             
             return student
             
         except Exception as e:
-            logger.error(f"Error updating student: {str(e)}")
+            logger.error("Error updating student: %s", e)
             raise
     
     async def delete_student(self, student_id: str) -> bool:
         """Delete a student"""
         try:
-            student = await self.get_student(student_id)
-            if not student:
+            # Atomic and one round-trip; the removed document is still needed for the log
+            deleted = await Student.get_pymongo_collection().find_one_and_delete(
+                {"student_id": student_id}
+            )
+            if deleted is None:
                 return False
-            
-            await student.delete()
+            student = Student.model_validate(deleted)
+            invalidate_analytics()
             
             # Log activity
-            await self.log_activity(
-                student_id,
+            self.log_activity(
+                student,
                 "student_deleted",
                 f"Student {student.name} deleted"
             )
             
             return True
         except Exception as e:
-            logger.error(f"Error deleting student: {str(e)}")
+            logger.error("Error deleting student: %s", e)
             raise
     
-    async def log_activity(self, student_id: str, activity_type: str, description: str):
-        """Log student activity"""
-        try:
-            student = await self.get_student(student_id)
-            if not student:
-                raise ValueError(f"Student with ID {student_id} not found")
-            
-            activity = ActivityLog(
-                student=student,
-                activity_type=activity_type,
-                description=description
-            )
-            await activity.insert()
-        except Exception as e:
-            logger.error(f"Error logging activity: {str(e)}")
-            raise
+    def log_activity(
+        self,
+        student: Student,
+        activity_type: str,
+        description: str,
+        timestamp: Optional[datetime] = None
+    ):
+        """Queue an activity log entry for an already-loaded student"""
+        # Callers log only once their own write has succeeded; the entry is then
+        # written in a batch off the request path instead of as a second round-trip
+        activity_writer.put(ActivityLog(
+            student=student,
+            activity_type=activity_type,
+            description=description,
+            timestamp=timestamp or utc_now()
+        ))
     
     async def get_total_students(self) -> int:
-        """Get total number of students"""
+        """Get total number of students from collection metadata"""
         try:
-            return await Student.count()
+            return await Student.get_pymongo_collection().estimated_document_count()
         except Exception as e:
-            logger.error(f"Error getting total students: {str(e)}")
+            logger.error("Error getting total students: %s", e)
             raise
     
     async def get_students_by_department(self) -> Dict[str, int]:
         """Get student count grouped by department"""
         try:
+            # Only the grouping key flows into $group, so the department index can cover it
             pipeline = [
-                {"$group": {"_id": "$department", "count": {"$sum": 1}}}
+                {"$project": {"department": 1, "_id": 0}},
+                {"$group": {"_id": "$department", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}}
             ]
             result = await Student.aggregate(pipeline).to_list(None)
             return {item["_id"]: item["count"] for item in result}
         except Exception as e:
-            logger.error(f"Error getting students by department: {str(e)}")
+            logger.error("Error getting students by department: %s", e)
             raise
     
-    async def get_recent_onboarded_students(self, limit: int = 5) -> List[Student]:
+    async def get_recent_onboarded_students(self, limit: int = 5) -> List[StudentResponse]:
         """Get recently added students"""
         try:
-            return await Student.find_all().sort("-created_at").limit(limit).to_list()
+            return await Student.find_all().sort("-created_at").limit(limit).project(StudentResponse).to_list()
         except Exception as e:
-            logger.error(f"Error getting recent students: {str(e)}")
+            logger.error("Error getting recent students: %s", e)
             raise
     
     async def get_active_students_last_7_days(self) -> int:
         """Get count of students with activity in last 7 days"""
         try:
-            seven_days_ago = datetime.utcnow() - timedelta(days=7)
+            seven_days_ago = utc_now() - timedelta(days=7)
             pipeline = [
                 {"$match": {"timestamp": {"$gte": seven_days_ago}}},
-                {"$group": {"_id": "$student", "count": {"$sum": 1}}},
+                {"$project": {"student": 1, "_id": 0}},
+                {"$group": {"_id": "$student"}},
                 {"$count": "total"}
             ]
             result = await ActivityLog.aggregate(pipeline).to_list(None)
             return result[0]["total"] if result else 0
         except Exception as e:
-            logger.error(f"Error getting active students: {str(e)}")
+            logger.error("Error getting active students: %s", e)
             raise
     
-    def get_cafeteria_timings(self) -> Dict:
+    async def get_analytics_bundle(self, recent_limit: int = 5) -> Dict:
+        """Get all dashboard analytics with a single aggregation over students"""
+        cache_key = (_analytics_version, recent_limit)
+        cached = _analytics_cache.get(cache_key) if ANALYTICS_CACHE_TTL > 0 else None
+        if cached is not None:
+            return cached
+        
+        try:
+            pipeline = [
+                {"$facet": {
+                    "by_department": [
+                        {"$project": {"department": 1, "_id": 0}},
+                        {"$group": {"_id": "$department", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1}}
+                    ],
+                    "recent": [
+                        {"$sort": {"created_at": -1}},
+                        {"$limit": recent_limit},
+                        {"$project": {"_id": 0}}
+                    ]
+                }}
+            ]
+            # The total comes from metadata and activity from another collection,
+            # so both run alongside the facet
+            (facets,), total_students, active_students = await asyncio.gather(
+                Student.aggregate(pipeline).to_list(1),
+                self.get_total_students(),
+                self.get_active_students_last_7_days()
+            )
+            analytics = {
+                "total_students": total_students,
+                "students_by_department": {
+                    item["_id"]: item["count"] for item in facets["by_department"]
+                },
+                "recent_students": facets["recent"],
+                "active_students_last_7_days": active_students
+            }
+            if ANALYTICS_CACHE_TTL > 0:
+                _analytics_cache.set(cache_key, analytics)
+            return analytics
+        except Exception as e:
+            logger.error("Error getting analytics: %s", e)
+            raise
+    
+    def get_cafeteria_timings(self) -> Mapping[str, str]:
         """Get cafeteria operating hours"""
-        return {
-            "weekdays": "7:30 AM - 8:00 PM",
-            "weekends": "8:00 AM - 6:00 PM"
-        }
+        return CAFETERIA_TIMINGS
     
-    def get_library_hours(self) -> Dict:
+    def get_library_hours(self) -> Mapping[str, str]:
         """Get library operating hours"""
-        return {
-            "weekdays": "8:00 AM - 10:00 PM",
-            "weekends": "9:00 AM - 6:00 PM"
-        }
+        return LIBRARY_HOURS
     
-    def get_event_schedule(self) -> List[Dict]:
+    def get_event_schedule(self) -> Sequence[Mapping[str, str]]:
         """Get upcoming campus events"""
-        return [
-            {
-                "name": "Tech Symposium 2025",
-                "date": "2025-10-15",
-                "location": "Main Auditorium"
-            },
-            {
-                "name": "Career Fair",
-                "date": "2025-10-20",
-                "location": "Student Center"
-            }
-        ]
+        return EVENT_SCHEDULE
     
     async def send_email(self, student_id: str, message: str) -> bool:
         """Mock email sending functionality"""
@@ -228,18 +408,24 @@ class CampusTools:
                 return False
             
             # Log the email activity
-            await self.log_activity(
-                student_id,
+            self.log_activity(
+                student,
                 "email_sent",
                 f"Email sent to {student.email}: {message[:50]}..."
             )
             
-            logger.info(f"Mock email sent to {student.email}: {message}")
+            logger.info("Mock email sent to %s: %s", student.email, message)
             return True
         except Exception as e:
-            logger.error(f"Error sending email: {str(e)}")
+            logger.error("Error sending email: %s", e)
             raise
 
+_campus_tools: Optional[CampusTools] = None
+
 async def get_campus_tools(client: AsyncIOMotorClient) -> CampusTools:
-    """Get campus tools instance"""
-    return CampusTools(client)
\ No newline at end of file
+    """Get the shared campus tools instance"""
+    global _campus_tools
+    # The Mongo client lives for the whole process, so one tools object serves every request
+    if _campus_tools is None or _campus_tools.client is not client:
+        _campus_tools = CampusTools(client)
+    return _campus_tools
\ No newline at end of file